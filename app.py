@@ -1,30 +1,113 @@
-from flask import Flask, render_template, request, jsonify
+import logging
+import os
+import threading
+import time
+
+from quart import Quart, render_template, request, jsonify
+from quart.json.provider import DefaultJSONProvider
+from quart.utils import run_sync
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from calendar_agent_deepseek import CalendarAgentDeepSeek
+from config_loader import load_config
 
-app = Flask(__name__)
+log = logging.getLogger(__name__)
 
-# Initialize the calendar agent
-try:
-    agent = CalendarAgentDeepSeek()
-    agent_ready = True
-except Exception as e:
-    print(f"Agent initialization failed: {e}")
-    agent_ready = False
+def _configure_logging():
+    """Log at the level set under "logging": {"level": ...} in the config file, INFO by default"""
+    level = 'INFO'
+    try:
+        level = str(load_config().get('logging', {}).get('level', level)).upper()
+    except Exception:
+        pass
+    if not isinstance(logging.getLevelName(level), int):
+        level = 'INFO'
+    logging.basicConfig(level=level, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+_configure_logging()
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson (UTF-8 output, no ASCII escaping)"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=self.default).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+app = Quart(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+
+# The calendar agent is created lazily, once per process
+_agent = None
+_agent_pid = None
+_agent_lock = threading.Lock()
+
+# After a failed initialization, requests get no agent for this long before it is retried
+AGENT_RETRY_BACKOFF = 30  # seconds
+_agent_failed_at = None
+
+def _current_agent():
+    """This process's calendar agent if it is already built, else None"""
+    if _agent is not None and _agent_pid == os.getpid():
+        return _agent
+    return None
+
+def get_agent():
+    """
+    Return this process's calendar agent, creating it on first use
+
+    The owning pid is recorded so a worker forked from a process that already built
+    the agent creates its own instead of sharing the parent's CalDAV/DeepSeek sockets.
+
+    Returns:
+        The agent, or None if initialization failed (retried after AGENT_RETRY_BACKOFF)
+    """
+    global _agent, _agent_pid, _agent_failed_at
+
+    agent = _current_agent()
+    if agent is not None:
+        return agent
+
+    with _agent_lock:
+        if _current_agent() is None:
+            _agent = None
+            if _agent_failed_at is not None and time.monotonic() - _agent_failed_at < AGENT_RETRY_BACKOFF:
+                return None
+            try:
+                _agent = CalendarAgentDeepSeek()
+                _agent_pid = os.getpid()
+                _agent_failed_at = None
+            except Exception as e:
+                log.error("Agent initialization failed: %s", e)
+                _agent = None
+                _agent_failed_at = time.monotonic()
+        return _agent
+
+# Cached /api/calendars payload: (expires_at, payload)
+CALENDARS_CACHE_TTL = 600  # seconds
+_calendars_cache = None
 
 @app.route('/')
-def index():
-    return render_template('index.html')
+async def index():
+    return await render_template('index.html')
 
 @app.route('/api/command', methods=['POST'])
-def process_command():
-    if not agent_ready:
+async def process_command():
+    # First use connects to CalDAV, keep that off the event loop
+    agent = _current_agent() or await run_sync(get_agent)()
+    if agent is None:
         return jsonify({
             'success': False,
             'message': '日历代理未初始化，请检查环境变量配置'
         })
 
-    data = request.get_json()
+    data = await request.get_json()
     user_input = data.get('command', '').strip()
     selected_calendar = data.get('calendar', None)
 
@@ -35,7 +118,7 @@ def process_command():
         })
 
     try:
-        response = agent.process_command(user_input, selected_calendar)
+        response = await agent.process_command_async(user_input, selected_calendar)
         return jsonify({
             'success': True,
             'message': response
@@ -47,20 +130,31 @@ def process_command():
         })
 
 @app.route('/api/calendars')
-def get_calendars():
-    if not agent_ready:
+async def get_calendars():
+    global _calendars_cache
+
+    agent = _current_agent() or await run_sync(get_agent)()
+    if agent is None:
         return jsonify({
             'success': False,
             'message': '日历代理未初始化'
         })
 
+    # ?refresh=1 re-lists calendars from the server and rebuilds the payload
+    refresh = request.args.get('refresh') == '1'
+    if not refresh and _calendars_cache and _calendars_cache[0] > time.monotonic():
+        return jsonify(_calendars_cache[1])
+
     try:
-        calendars = agent.get_calendar_list()
-        return jsonify({
+        if refresh:
+            await run_sync(agent.refresh_calendars)()
+        payload = {
             'success': True,
-            'calendars': calendars,
+            'calendars': agent.get_calendar_list(),
             'message': agent.get_calendar_list_formatted()
-        })
+        }
+        _calendars_cache = (time.monotonic() + CALENDARS_CACHE_TTL, payload)
+        return jsonify(payload)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -68,4 +162,8 @@ def get_calendars():
         })
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5002)
\ No newline at end of file
+    import uvicorn
+
+    # Equivalent to `WEB_CONCURRENCY=N uvicorn app:app --host 0.0.0.0 --port 5002`
+    uvicorn.run('app:app', host='0.0.0.0', port=5002,
+                workers=int(os.getenv('WEB_CONCURRENCY', '1')))
@@ -1,12 +1,25 @@
 import caldav
+from caldav.elements import cdav, dav
+from caldav.lib import error as caldav_error
 from icalendar import Calendar, Event, vCalAddress, vText
-from datetime import datetime, timedelta
-import pytz
+from datetime import date, datetime, timedelta, timezone
+import importlib
+import logging
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import List, Dict, Optional
 
+log = logging.getLogger(__name__)
+
+# Upper bound on concurrent CalDAV requests issued by a single operation
+MAX_PARALLEL_REQUESTS = 8
+
 class AppleCalendarClient:
-    def __init__(self, server_url: str, username: str, password: str):
+    def __init__(self, server_url: str, username: str, password: str, cache_ttl: int = 0):
         """
         Initialize CalDAV client for Apple Calendar
 
@@ -14,41 +27,52 @@ class AppleCalendarClient:
         - Primary: https://caldav.icloud.com/
         - Alternative: https://pXX-caldav.icloud.com/ (where XX is server number)
         """
-        import requests
-
-        # 设置更长的超时时间
-        session = requests.Session()
-        session.timeout = 30  # 30秒超时
-
         self.client = caldav.DAVClient(
             url=server_url,
             username=username,
-            password=password
+            password=password,
+            timeout=30  # 30秒超时
         )
 
+        # DAVClient keeps one session for all calls; give it a pool large enough for the
+        # concurrent lookups so every request reuses a kept-alive TLS connection
+        _mount_pooled_adapters(self.client.session)
+
+        # Parsed read results: key -> (expires_at, events). The cache lives in this process
+        # and only sees this process's writes, so it is off unless the caller opts in
+        self._cache_ttl = max(int(cache_ttl or 0), 0)
+        self._events_cache: Dict[tuple, tuple] = {}
+        # Prefetch, bulk-delete and request threads all touch the cache
+        self._cache_lock = threading.Lock()
+        # Bumped by every invalidation; a read that started before one must not be cached
+        self._cache_generation = 0
+
         try:
-            print("正在连接 CalDAV 服务器...")
-            print(f"服务器URL: {server_url}")
-            print(f"用户名: {username}")
+            log.info("正在连接 CalDAV 服务器: %s (用户名: %s)", server_url, username)
 
             self.principal = self.client.principal()
-            print("✓ 成功获取 principal")
+            log.debug("✓ 成功获取 principal")
 
-            print("正在获取日历列表...")
-            self.calendars = self.principal.calendars()
-            print(f"✓ 成功连接，找到 {len(self.calendars)} 个日历")
+            self.refresh_calendars()
+            log.info("✓ 成功连接，找到 %d 个日历", len(self.calendars))
 
-            # Print calendar names for debugging
+            # Calendar names for debugging
             for i, cal in enumerate(self.calendars):
-                print(f"  日历 {i+1}: {cal.name}")
+                log.debug("  日历 %d: %s", i + 1, cal.name)
 
         except Exception as e:
-            print(f"❌ CalDAV 连接失败: {e}")
-            print(f"错误类型: {type(e).__name__}")
-            import traceback
-            print(f"详细错误信息:\n{traceback.format_exc()}")
+            log.exception("❌ CalDAV 连接失败 (%s): %s", type(e).__name__, e)
             raise
 
+    def refresh_calendars(self):
+        """Re-list calendars from the server and rebuild the name index"""
+        self.calendars = self.principal.calendars()
+        # Name -> calendar index; iterate in reverse so the first calendar wins on duplicate names
+        self._by_name = {cal.name: cal for cal in reversed(self.calendars)}
+        # Collection URL -> calendar, to find the owner of an event from its href
+        self._by_url = {str(cal.url).rstrip('/') + '/': cal for cal in self.calendars}
+        self.invalidate_cache()
+
     def get_calendars(self) -> List[str]:
         """Get list of available calendars"""
         return [cal.name for cal in self.calendars]
@@ -57,6 +81,52 @@ class AppleCalendarClient:
         """Get the default calendar"""
         return self.calendars[0] if self.calendars else None
 
+    @property
+    def cache_enabled(self) -> bool:
+        """Whether read results are cached in this process"""
+        return self._cache_ttl > 0
+
+    def _cache_get(self, key: tuple) -> Optional[List[Dict]]:
+        """Return cached events for key, or None on miss/expiry"""
+        with self._cache_lock:
+            entry = self._events_cache.get(key)
+            if entry is None:
+                return None
+            expires_at, events = entry
+            if expires_at < time.monotonic():
+                self._events_cache.pop(key, None)
+                return None
+            return list(events)
+
+    def _cache_generation_now(self) -> int:
+        """Take before querying the server and pass to _cache_set with the result"""
+        with self._cache_lock:
+            return self._cache_generation
+
+    def _cache_set(self, key: tuple, events: List[Dict], generation: int):
+        """
+        Store events for key, unless the cache was invalidated since generation was taken
+
+        A read that overlaps a write may have seen the server before the write, and
+        storing it after the write's invalidation would hide the change for a whole TTL.
+        """
+        if not self.cache_enabled:
+            return
+        with self._cache_lock:
+            if generation != self._cache_generation:
+                return
+            self._events_cache[key] = (time.monotonic() + self._cache_ttl, list(events))
+
+    def invalidate_cache(self, calendar_name: str = None):
+        """Drop cached reads for one calendar, or for all calendars if no name given"""
+        with self._cache_lock:
+            self._cache_generation += 1
+            if calendar_name is None:
+                self._events_cache.clear()
+                return
+            for key in [k for k in self._events_cache if k[1] == calendar_name]:
+                del self._events_cache[key]
+
     def create_event(self,
                     title: str,
                     start_time: datetime,
@@ -81,10 +151,11 @@ class AppleCalendarClient:
             event.add('location', location)
 
         # Add creation timestamp
-        event.add('dtstamp', datetime.now(pytz.UTC))
+        event.add('dtstamp', datetime.now(timezone.utc))
 
         # Save event
         calendar_event = calendar.save_event(event.to_ical())
+        self.invalidate_cache(calendar.name)
         return calendar_event.url
 
     def get_events(self,
@@ -103,23 +174,51 @@ class AppleCalendarClient:
         if not end_date:
             end_date = start_date + timedelta(days=1)
 
-        events = calendar.date_search(start=start_date, end=end_date)
+        cache_key = ('events', calendar.name, start_date, end_date)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
 
-        parsed_events = []
-        for event in events:
-            ical_data = event.icalendar_component
-            event_data = {
-                'id': event.url,
-                'title': str(ical_data.get('summary', '')),
-                'start': ical_data.get('dtstart').dt if ical_data.get('dtstart') else None,
-                'end': ical_data.get('dtend').dt if ical_data.get('dtend') else None,
-                'description': str(ical_data.get('description', '')),
-                'location': str(ical_data.get('location', ''))
-            }
-            parsed_events.append(event_data)
+        generation = self._cache_generation_now()
+        events = self._date_search_chunked(calendar, start_date, end_date)
 
+        parsed_events = [_parse_event(event) for event in events]
+
+        self._cache_set(cache_key, parsed_events, generation)
         return parsed_events
 
+    def get_busy_ranges(self,
+                        start: datetime,
+                        end: datetime,
+                        calendar_name: str = None) -> List[tuple]:
+        """Get busy (start, end) ranges within a time window using a CalDAV free-busy query"""
+        calendar = self.get_calendar_by_name(calendar_name) if calendar_name else self.get_default_calendar()
+
+        if not calendar:
+            return []
+
+        try:
+            freebusy = calendar.freebusy_request(start, end)
+
+            periods = freebusy.icalendar_component.get('freebusy', [])
+            if not isinstance(periods, list):
+                periods = [periods]
+
+            busy_ranges = []
+            for period in periods:
+                period_start, period_end = period.dt
+                if isinstance(period_end, timedelta):
+                    period_end = period_start + period_end
+                busy_ranges.append((period_start, period_end))
+
+            return sorted(busy_ranges)
+        except Exception as e:
+            # 服务器不支持 free-busy 查询，或返回的不是有效的 VFREEBUSY，退回到读取事件
+            log.info("free-busy 查询不可用，改为读取事件: %s", e)
+
+        busy_ranges = (_busy_range(event['start'], event['end']) for event in self.get_events(start, end, calendar_name))
+        return sorted(busy_range for busy_range in busy_ranges if busy_range is not None)
+
     def update_event(self,
                     event_id: str,
                     title: str = None,
@@ -130,70 +229,156 @@ class AppleCalendarClient:
                     calendar_name: str = None) -> bool:
         """Update an existing event"""
         try:
-            # If calendar_name is specified, only search in that calendar
-            calendars_to_search = [self.get_calendar_by_name(calendar_name)] if calendar_name else self.calendars
+            calendar, event = self._load_event(event_id, calendar_name)
+            if event is None:
+                log.warning("Event not found: %s", event_id)
+                return False
 
-            for calendar in calendars_to_search:
-                if not calendar:
-                    continue
+            ical_data = event.icalendar_component
 
-                events = calendar.events()
-                for event in events:
-                    if event.url == event_id:
-                        ical_data = event.icalendar_component
-
-                        # Update fields
-                        if title:
-                            ical_data['summary'] = title
-                        if start_time:
-                            ical_data['dtstart'] = start_time
-                        if end_time:
-                            ical_data['dtend'] = end_time
-                        if description is not None:
-                            ical_data['description'] = description
-                        if location is not None:
-                            ical_data['location'] = location
-
-                        # Save updated event
-                        event.data = ical_data.to_ical()
-                        return True
-
-            print(f"Event not found: {event_id}")
-            return False
+            # Only the fields that were passed in, in their iCalendar property names
+            changes = {}
+            if title:
+                changes['summary'] = title
+            if start_time:
+                changes['dtstart'] = start_time
+            if 'duration' in ical_data:
+                # DURATION is relative to DTSTART, so a new start already moves the end;
+                # a new end becomes a new duration, never a DTEND next to it
+                if end_time:
+                    changes['duration'] = end_time - (start_time or ical_data['dtstart'].dt)
+            elif end_time:
+                changes['dtend'] = end_time
+            elif start_time and 'dtstart' in ical_data and 'dtend' in ical_data:
+                # Only the start moved: keep the stored duration
+                changes['dtend'] = start_time + (ical_data['dtend'].dt - ical_data['dtstart'].dt)
+            if description is not None:
+                changes['description'] = description
+            if location is not None:
+                changes['location'] = location
+
+            changed = False
+            for name, value in changes.items():
+                if _property_value(ical_data, name) == value:
+                    continue
+                ical_data.pop(name, None)
+                ical_data.add(name, value)
+                changed = True
+
+            if not changed:
+                # Nothing differs from the stored event, skip the PUT
+                return True
+
+            # Conditional PUT: fails with 412 if the event changed on the server since we read it
+            headers = {'Content-Type': 'text/calendar; charset=utf-8'}
+            etag = event.props.get(dav.GetEtag.tag) or event.get_property(dav.GetEtag())
+            if etag:
+                headers['If-Match'] = etag
+
+            response = self.client.put(str(event.url), event.icalendar_instance.to_ical(), headers)
+            if response.status == 412:
+                log.warning("事件已在服务器上被修改，请重新获取后再更新: %s", event_id)
+                return False
+            if response.status not in (200, 201, 204):
+                log.error("Error updating event: HTTP %s", response.status)
+                return False
+
+            self.invalidate_cache(calendar.name if calendar else None)
+            return True
         except Exception as e:
-            print(f"Error updating event: {e}")
+            log.error("Error updating event: %s", e)
             return False
 
     def delete_event(self, event_id: str, calendar_name: str = None) -> bool:
         """Delete an event"""
         try:
-            print(f"尝试删除事件: {event_id}")  # 调试信息
+            log.debug("尝试删除事件: %s", event_id)
+
+            calendar, event = self._load_event(event_id, calendar_name)
+            if event is None:
+                log.warning("Event not found: %s", event_id)
+                return False
+
+            log.debug("找到事件，开始删除: %s", event.url)
+            event.delete()
+            log.debug("删除操作完成")
+            self.invalidate_cache(calendar.name if calendar else None)
+            return True
+        except Exception as e:
+            log.error("Error deleting event: %s", e)
+            return False
 
-            # If calendar_name is specified, only search in that calendar
-            calendars_to_search = [self.get_calendar_by_name(calendar_name)] if calendar_name else self.calendars
+    def _load_event(self, event_id: str, calendar_name: str = None):
+        """
+        Fetch an event directly by its URL (one GET)
 
-            for calendar in calendars_to_search:
-                if not calendar:
-                    continue
+        Calendars are only scanned when the GET returns 404 and no calendar_name was
+        given, in case the stored id is not the canonical URL.
 
-                events = calendar.events()
-                for event in events:
-                    if str(event.url) == str(event_id):
-                        print(f"找到事件，开始删除: {event.url}")  # 调试信息
-                        event.delete()
-                        print("删除操作完成")  # 调试信息
-                        return True
+        Returns:
+            (calendar, event) tuple; calendar is None when the event is not inside a
+            known calendar collection, event is None when not found
+        """
+        if calendar_name:
+            calendar = self.get_calendar_by_name(calendar_name)
+            if calendar is None:
+                return None, None
+        else:
+            calendar = self._owning_calendar(event_id)
 
-            print(f"Event not found: {event_id}")
-            return False
-        except Exception as e:
-            print(f"Error deleting event: {e}")
-            return False
+        try:
+            event = caldav.Event(client=self.client, url=event_id, parent=calendar).load()
+            return calendar, event
+        except caldav_error.NotFoundError:
+            if calendar_name:
+                return None, None
+            return self._find_event(event_id, self.calendars)
+
+    def _owning_calendar(self, event_id: str):
+        """Calendar whose collection contains the event href, without any request"""
+        parent_url = str(event_id).rsplit('/', 1)[0] + '/'
+        return self._by_url.get(parent_url)
+
+    def _find_event(self, event_id: str, calendars: list):
+        """Find an event by URL, listing the candidate calendars concurrently
+
+        Calendars are listed by href only (PROPFIND, no event bodies); the body of the
+        matching href is then fetched with a single calendar-multiget REPORT.
+
+        Returns:
+            (calendar, event) tuple, or (None, None) if not found
+        """
+        calendars = [cal for cal in calendars if cal]
+        if not calendars:
+            return None, None
+
+        target = str(event_id)
+
+        def list_hrefs(cal):
+            # str(url) -> URL; multiget needs the URL object (it reads .path), not the id string
+            return cal, {str(url): url for url, _, _ in cal.children()}
+
+        workers = min(MAX_PARALLEL_REQUESTS, len(calendars))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for calendar, hrefs in executor.map(list_hrefs, calendars):
+                url = hrefs.get(target)
+                if url is not None:
+                    events = list(calendar.multiget([url]))
+                    return (calendar, events[0]) if events else (None, None)
+
+        return None, None
+
+    def delete_events_bulk(self, event_ids: List[str], calendar_name: str = None) -> List[bool]:
+        """Delete several events concurrently; returns one success flag per id, in order"""
+        if not event_ids:
+            return []
+
+        workers = min(MAX_PARALLEL_REQUESTS, len(event_ids))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda event_id: self.delete_event(event_id, calendar_name), event_ids))
 
     def search_events(self, query: str, calendar_name: str = None) -> List[Dict]:
         """Search events by title or description, only return future and today's events"""
-        from datetime import datetime
-
         calendar = self.get_calendar_by_name(calendar_name) if calendar_name else self.get_default_calendar()
 
         if not calendar:
@@ -203,59 +388,222 @@ class AppleCalendarClient:
         current_time = datetime.now()
         three_months_ago = current_time.replace(day=1) - timedelta(days=90)
 
-        try:
-            # 使用日期范围搜索，避免加载所有事件
-            events = calendar.date_search(start=three_months_ago, end=current_time + timedelta(days=365))
-            matching_events = []
-
-            for event in events:
-                ical_data = event.icalendar_component
-                title = str(ical_data.get('summary', '')).lower()
-                desc = str(ical_data.get('description', '')).lower()
-
-                if query.lower() in title or query.lower() in desc:
-                    event_data = {
-                        'id': event.url,
-                        'title': str(ical_data.get('summary', '')),
-                        'start': ical_data.get('dtstart').dt if ical_data.get('dtstart') else None,
-                        'end': ical_data.get('dtend').dt if ical_data.get('dtend') else None,
-                        'description': str(ical_data.get('description', '')),
-                        'location': str(ical_data.get('location', ''))
-                    }
-                    matching_events.append(event_data)
+        query_lower = query.lower()
+        cache_key = ('search', calendar.name, query_lower)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+        start, end = three_months_ago, current_time + timedelta(days=365)
+        generation = self._cache_generation_now()
 
+        try:
+            try:
+                # 让服务器按 SUMMARY / DESCRIPTION 过滤，减少返回的事件
+                events = []
+                seen = set()
+                for prop in ('SUMMARY', 'DESCRIPTION'):
+                    for event in self._text_match_search(calendar, prop, query, start, end):
+                        if str(event.url) not in seen:
+                            seen.add(str(event.url))
+                            events.append(event)
+            except caldav_error.DAVError as e:
+                # 服务器拒绝 text-match 查询（不支持、403 等），退回到日期范围搜索
+                log.info("服务器端搜索不可用，改为本地匹配: %s", e)
+                events = self._date_search_chunked(calendar, start, end)
+
+            # 总是在本地再匹配一次：有的服务器忽略 text-match，返回范围内的全部事件，
+            # 不过滤的话按标题删除会删掉整个日历
+            events = [event for event in events if _event_matches(event, query_lower)]
+
+            matching_events = [_parse_event(event) for event in events]
+
+            self._cache_set(cache_key, matching_events, generation)
             return matching_events
         except Exception as e:
-            print(f"搜索事件时出错: {e}")
+            log.error("搜索事件时出错: %s", e)
             return []
 
+    def _date_search_chunked(self, calendar, start: datetime, end: datetime) -> list:
+        """date_search split into monthly windows that are queried concurrently
+
+        Keeps each REPORT response small on busy calendars; an occurrence that spans a
+        month boundary is returned by both neighbouring windows and is kept once.
+        """
+        chunks = _month_chunks(start, end)
+        if len(chunks) <= 1:
+            return calendar.date_search(start=start, end=end)
+
+        workers = min(MAX_PARALLEL_REQUESTS, len(chunks))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(lambda chunk: calendar.date_search(start=chunk[0], end=chunk[1]), chunks)
+
+            events = []
+            seen = set()
+            for chunk_events in results:
+                for event in chunk_events:
+                    dtstart = event.icalendar_component.get('dtstart')
+                    key = (str(event.url), dtstart.dt if dtstart else None)
+                    if key not in seen:
+                        seen.add(key)
+                        events.append(event)
+
+        return events
+
+    def _text_match_search(self, calendar, prop: str, query: str, start: datetime, end: datetime):
+        """Issue a calendar-query REPORT for events in [start, end) whose prop contains query (case-insensitive)"""
+        xml = cdav.CalendarQuery() + [
+            dav.Prop() + cdav.CalendarData(),
+            cdav.Filter() + (
+                cdav.CompFilter("VCALENDAR") + (
+                    cdav.CompFilter("VEVENT") + [
+                        cdav.TimeRange(start, end),
+                        cdav.PropFilter(prop) + cdav.TextMatch(query, collation="i;unicode-casemap")
+                    ]
+                )
+            )
+        ]
+        return calendar.search(xml=xml, comp_class=caldav.Event)
+
     def get_calendar_by_name(self, name: str):
         """Get calendar by name"""
-        for cal in self.calendars:
-            if cal.name == name:
-                return cal
+        return self._by_name.get(name)
+
+def _busy_range(start, end) -> Optional[tuple]:
+    """
+    An event's (start, end) as aware datetimes, comparable with free-busy periods
+
+    All-day events (dates) cover local midnight to midnight; floating times are taken
+    as local time. Returns None for a timed event without an end.
+    """
+    if not isinstance(start, datetime):
+        end = end or start + timedelta(days=1)
+        return (datetime.combine(start, datetime.min.time()).astimezone(),
+                datetime.combine(end, datetime.min.time()).astimezone())
+    if not isinstance(end, datetime):
         return None
+    return start.astimezone(), end.astimezone()
+
+def _event_matches(event, query_lower: str) -> bool:
+    """Whether the event's summary or description contains query_lower, ignoring case"""
+    ical_data = event.icalendar_component
+    summary = str(ical_data.get('summary', ''))
+    description = str(ical_data.get('description', ''))
+    return query_lower in summary.lower() or query_lower in description.lower()
+
+def _mount_pooled_adapters(session):
+    """
+    Mount larger connection pools on the DAVClient session
+
+    caldav < 2 uses a requests.Session, caldav >= 2 a niquests.Session, and each only
+    accepts adapters from its own library, so the adapter class is taken from the
+    package the session comes from.
+    """
+    adapters = importlib.import_module(type(session).__module__.split('.')[0] + '.adapters')
+    kwargs = {'pool_connections': 16, 'pool_maxsize': 32, 'max_retries': 3}
+
+    https_kwargs = dict(kwargs)
+    # niquests remembers HTTP/3 endpoints in the session's Alt-Svc cache; keep using it
+    if getattr(session, 'quic_cache_layer', None) is not None:
+        https_kwargs['quic_cache_layer'] = session.quic_cache_layer
+
+    session.mount("https://", adapters.HTTPAdapter(**https_kwargs))
+    session.mount("http://", adapters.HTTPAdapter(**kwargs))
+
+def _month_chunks(start: datetime, end: datetime) -> List[tuple]:
+    """Split [start, end) into consecutive (start, end) windows that never cross a month boundary"""
+    chunks = []
+    chunk_start = start
+    while chunk_start < end:
+        month_start = chunk_start.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        if month_start.month == 12:
+            next_month = month_start.replace(year=month_start.year + 1, month=1)
+        else:
+            next_month = month_start.replace(month=month_start.month + 1)
+        chunk_end = min(next_month, end)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end
+    return chunks
+
+def _property_value(ical_data, name: str):
+    """Current value of a VEVENT property, comparable with the update_event arguments"""
+    prop = ical_data.get(name)
+    if prop is None:
+        return '' if name in ('description', 'location') else None
+    return prop.dt if name in ('dtstart', 'dtend', 'duration') else str(prop)
+
+def _parse_event(event) -> Dict:
+    """Flatten a CalDAV event into the dict returned by get_events/search_events"""
+    ical_data = event.icalendar_component
+    dtstart = ical_data.get('dtstart')
+    dtend = ical_data.get('dtend')
+    return {
+        'id': event.url,
+        'title': str(ical_data.get('summary', '')),
+        'start': dtstart.dt if dtstart else None,
+        'end': dtend.dt if dtend else None,
+        'description': str(ical_data.get('description', '')),
+        'location': str(ical_data.get('location', ''))
+    }
 
 # Helper functions for date parsing
+
+# Relative-day markers -> days from today
+_DATE_MARKERS = {
+    'today': 0, 'tomorrow': 1, 'next week': 7,
+    '今天': 0, '明天': 1, '后天': 2, '下周': 7,
+}
+
+# Fast paths for the common "tomorrow", "today 3pm", "next week at 10:30" shapes
+_NATURAL_DATE_PATTERNS = [
+    re.compile(r'^(?P<day>today|tomorrow|next week)$'),
+    re.compile(r'^(?P<day>today|tomorrow|next week)\s+(?:at\s+)?'
+               r'(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<ampm>am|pm)$'),
+    re.compile(r'^(?P<day>today|tomorrow|next week)\s+(?:at\s+)?'
+               r'(?P<hour>\d{1,2}):(?P<minute>\d{2})$'),
+]
+
 def parse_natural_date(date_str: str) -> datetime:
     """Parse natural language dates like 'tomorrow 3pm', 'next Monday', etc."""
-    from dateutil.parser import parse
-    from dateutil.relativedelta import relativedelta
+    # Results only depend on the phrase and the current date, so memoize on both
+    return _parse_natural_date(date_str.lower().strip(), date.today())
+
+@lru_cache(maxsize=1024)
+def _parse_natural_date(date_str: str, today: date) -> datetime:
+    for pattern in _NATURAL_DATE_PATTERNS:
+        match = pattern.match(date_str)
+        if match:
+            parsed = _natural_match_to_datetime(match, today)
+            if parsed:
+                return parsed
+            break
 
-    date_str = date_str.lower().strip()
+    from dateutil.parser import parse
 
-    # Handle common natural language patterns
-    if 'tomorrow' in date_str:
-        base_date = datetime.now() + timedelta(days=1)
-        date_str = date_str.replace('tomorrow', base_date.strftime('%Y-%m-%d'))
-    elif 'today' in date_str:
-        base_date = datetime.now()
-        date_str = date_str.replace('today', base_date.strftime('%Y-%m-%d'))
-    elif 'next week' in date_str:
-        base_date = datetime.now() + timedelta(weeks=1)
-        date_str = date_str.replace('next week', base_date.strftime('%Y-%m-%d'))
+    # Rewrite relative-day markers into ISO dates; a few C-level substring checks, no regex scan
+    for marker, days in _DATE_MARKERS.items():
+        if marker in date_str:
+            date_str = date_str.replace(marker, f" {(today + timedelta(days=days)):%Y-%m-%d} ")
+    date_str = date_str.strip()
 
     try:
         return parse(date_str)
     except:
-        raise ValueError(f"Could not parse date: {date_str}")
\ No newline at end of file
+        raise ValueError(f"Could not parse date: {date_str}")
+
+def _natural_match_to_datetime(match, today: date) -> Optional[datetime]:
+    """Build a datetime from a fast-path match, or None if the clock time is out of range"""
+    fields = match.groupdict()
+    hour = int(fields.get('hour') or 0)
+    minute = int(fields.get('minute') or 0)
+    ampm = fields.get('ampm')
+
+    if ampm:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if ampm == 'pm' else 0)
+    if hour > 23 or minute > 59:
+        return None
+
+    day = today + timedelta(days=_DATE_MARKERS[fields['day']])
+    return datetime(day.year, day.month, day.day, hour, minute)
@@ -1,19 +1,62 @@
-import os
-import json
+import asyncio
+import logging
+import time
+from functools import lru_cache
 from typing import Dict, List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from caldav_client import AppleCalendarClient
-from deepseek_parser import DeepSeekCalendarParser
+from config_loader import AGENT_REQUIRED_FIELDS, load_config
+
+log = logging.getLogger(__name__)
+
+# Pieces of the schedule listing built by _handle_read_events
+_RESP_HEADER_SCHEDULE = "📅 您的日程安排:\n\n"
+_EVENT_LINE = "{i}. {title}\n   时间: {start} - {end}\n"
+_LOC_LINE = "   地点: {location}\n"
+_DESC_LINE = "   描述: {description}\n"
+
+@lru_cache(maxsize=4)
+def _today_bounds(epoch_minute: int):
+    """
+    Day boundaries for the local date at the given minute since the epoch
+
+    Returns:
+        (start_of_day, end_of_day, tomorrow) - two datetimes and a date
+    """
+    start_of_day = datetime.fromtimestamp(epoch_minute * 60).replace(hour=0, minute=0, second=0, microsecond=0)
+    end_of_day = start_of_day.replace(hour=23, minute=59, second=59)
+    return start_of_day, end_of_day, start_of_day.date() + timedelta(days=1)
+
+def _current_day_bounds():
+    """_today_bounds for now; recomputed at most once a minute"""
+    return _today_bounds(int(time.time() // 60))
+
+def _read_range(parsed_intent: Dict):
+    """(start, end) a read command covers; today when no start time was parsed"""
+    if parsed_intent.get('start_time'):
+        start_date = parsed_intent['start_time']
+
+        # Use provided end_time if available, otherwise default to end of day
+        if parsed_intent.get('end_time'):
+            return start_date, parsed_intent['end_time']
+        return start_date, start_date.replace(hour=23, minute=59, second=59)
+
+    # Default to today
+    start_of_day, end_of_day, _ = _current_day_bounds()
+    return start_of_day, end_of_day
 
 class CalendarAgentDeepSeek:
     def __init__(self):
         """Initialize the calendar agent with DeepSeek NLP and CalDAV client"""
-        # Initialize DeepSeek parser
-        self.nlp_parser = DeepSeekCalendarParser()
+        # Imported here so importing this module does not pull in caldav/icalendar/requests
+        from caldav_client import AppleCalendarClient
+        from deepseek_parser import DeepSeekCalendarParser
 
         # Get credentials from config.json
-        config = self._load_config()
+        config = load_config(required=AGENT_REQUIRED_FIELDS)
+
+        # Initialize DeepSeek parser with the already-loaded config
+        self.nlp_parser = DeepSeekCalendarParser(config=config)
 
         server_url = config['caldav']['server_url']
         username = config['caldav']['username']
@@ -22,56 +65,27 @@ class CalendarAgentDeepSeek:
         if not username or not password:
             raise ValueError("请在 config.json 文件中设置 caldav.username 和 caldav.password")
 
-        try:
-            self.calendar_client = AppleCalendarClient(server_url, username, password)
-            print("✓ 日历客户端初始化成功")
-        except Exception as e:
-            print(f"❌ 日历客户端初始化失败: {e}")
-            raise ValueError(f"日历代理初始化失败: {e}")
+        # Formatted calendar list, built on first use and dropped by refresh_calendars()
+        self._calendar_list_formatted = None
 
-    def _load_config(self) -> Dict:
-        """Load configuration with priority: config_private.json > config.json"""
-        # Try config_private.json first (private config)
-        private_config_path = 'config_private.json'
-        config_path = 'config.json'
-
-        if os.path.exists(private_config_path):
-            config_path = private_config_path
-            print(f"使用私有配置文件: {config_path}")
-        elif os.path.exists(config_path):
-            print(f"使用默认配置文件: {config_path}")
-        else:
-            raise FileNotFoundError(
-                f"配置文件不存在，请创建 {private_config_path} 或 {config_path} 并填写配置信息"
-            )
+        # Intent -> handler, looked up once per command in _execute_intent
+        self._dispatch = {
+            'create': self._handle_create_event,
+            'read': self._handle_read_events,
+            'update': self._handle_update_event,
+            'delete': self._handle_delete_event,
+            'availability': self._handle_check_availability,
+        }
+
+        # Opt-in: only safe when this is the only process writing to the calendars
+        cache_ttl = config.get('cache', {}).get('events_ttl', 0)
 
         try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-
-            # Validate required fields
-            required_fields = [
-                'caldav.username',
-                'caldav.password',
-                'deepseek.api_key'
-            ]
-
-            for field in required_fields:
-                keys = field.split('.')
-                current = config
-                for key in keys:
-                    if key not in current:
-                        raise ValueError(f"配置文件中缺少必要字段: {field}")
-                    current = current[key]
-                if not current:
-                    raise ValueError(f"配置字段 {field} 不能为空")
-
-            return config
-
-        except json.JSONDecodeError as e:
-            raise ValueError(f"配置文件格式错误: {e}")
+            self.calendar_client = AppleCalendarClient(server_url, username, password, cache_ttl=cache_ttl)
+            log.info("✓ 日历客户端初始化成功")
         except Exception as e:
-            raise ValueError(f"读取配置文件失败: {e}")
+            log.error("❌ 日历客户端初始化失败: %s", e)
+            raise ValueError(f"日历代理初始化失败: {e}")
 
     def process_command(self, user_input: str, selected_calendar: str = None) -> str:
         """
@@ -84,31 +98,84 @@ class CalendarAgentDeepSeek:
             Response message to user
         """
         try:
-            print(f"🔍 Processing command: {user_input}")
+            log.debug("🔍 Processing command: %s", user_input)
             # Parse user intent and extract details using DeepSeek
             parsed_intent = self.nlp_parser.parse_command(user_input)
-            print(f"🔍 Parsed intent: {parsed_intent}")
-
-            if not parsed_intent.get('intent'):
-                print(f"❌ No intent detected for: {user_input}")
-                return "抱歉，我没有理解您的指令。请尝试使用更清晰的表达，比如：'创建明天下午3点的会议' 或 '查看今天的日程'"
-
-            intent = parsed_intent['intent']
-
-            if intent == 'create':
-                return self._handle_create_event(parsed_intent, selected_calendar)
-            elif intent == 'read':
-                return self._handle_read_events(parsed_intent, selected_calendar)
-            elif intent == 'update':
-                return self._handle_update_event(parsed_intent, selected_calendar)
-            elif intent == 'delete':
-                return self._handle_delete_event(parsed_intent, selected_calendar)
-            else:
-                return f"暂不支持的操作: {intent}"
+            return self._execute_intent(parsed_intent, user_input, selected_calendar)
+
+        except Exception as e:
+            return f"处理指令时出现错误: {str(e)}"
+
+    async def process_command_async(self, user_input: str, selected_calendar: str = None) -> str:
+        """
+        Async variant of process_command, used by the web app
+
+        While DeepSeek parses the command, today's events are fetched speculatively
+        (viewing today is the most common request). The result lands in the CalDAV
+        client's read cache, where a matching read picks it up without another request.
+        Without a read cache (cache.events_ttl unset) there is nothing to warm, so it is skipped.
+
+        Args:
+            user_input: Natural language command from user
+
+        Returns:
+            Response message to user
+        """
+        loop = asyncio.get_running_loop()
+        prefetch = None
+        if self.calendar_client.cache_enabled:
+            start_of_day, end_of_day, _ = _current_day_bounds()
+            prefetch = loop.run_in_executor(
+                None, self._prefetch_events, start_of_day, end_of_day, selected_calendar
+            )
+
+        try:
+            log.debug("🔍 Processing command: %s", user_input)
+            parsed_intent = await self.nlp_parser.parse_command_async(user_input)
+
+            if prefetch is not None:
+                if (parsed_intent.get('intent') == 'read' and not parsed_intent.get('title')
+                        and _read_range(parsed_intent) == (start_of_day, end_of_day)):
+                    # Today's listing: let the speculative read finish so the handler hits the cache
+                    await prefetch
+                else:
+                    # Only stops a prefetch that has not started; one already running keeps
+                    # going next to the handler, and _cache_set drops its result if the
+                    # handler's write invalidated the cache in the meantime
+                    prefetch.cancel()
+
+            return await loop.run_in_executor(
+                None, self._execute_intent, parsed_intent, user_input, selected_calendar
+            )
 
         except Exception as e:
             return f"处理指令时出现错误: {str(e)}"
 
+    def _prefetch_events(self, start_date: datetime, end_date: datetime, selected_calendar: str = None):
+        """Warm the read cache for a time range; errors are left for the real read to report"""
+        try:
+            self.calendar_client.get_events(
+                start_date=start_date,
+                end_date=end_date,
+                calendar_name=selected_calendar if selected_calendar is not None else None
+            )
+        except Exception as e:
+            log.debug("预取日程失败: %s", e)
+
+    def _execute_intent(self, parsed_intent: Dict, user_input: str, selected_calendar: str = None) -> str:
+        """Run the calendar operation for an already-parsed command"""
+        log.debug("🔍 Parsed intent: %s", parsed_intent)
+
+        if not parsed_intent.get('intent'):
+            log.info("❌ No intent detected for: %s", user_input)
+            return "抱歉，我没有理解您的指令。请尝试使用更清晰的表达，比如：'创建明天下午3点的会议' 或 '查看今天的日程'"
+
+        intent = parsed_intent['intent']
+        handler = self._dispatch.get(intent)
+        if handler is None:
+            return f"暂不支持的操作: {intent}"
+        return handler(parsed_intent, selected_calendar)
+
     def _handle_create_event(self, parsed_intent: Dict, selected_calendar: str = None) -> str:
         """Handle event creation"""
         # Validate required fields
@@ -118,21 +185,15 @@ class CalendarAgentDeepSeek:
         if not parsed_intent.get('start_time'):
             return "请提供事件的时间，例如：'明天下午3点'"
 
-        # Set default end time if not provided
-        from datetime import datetime
-
-        # Handle both string and datetime objects
+        # The parser already returns datetime objects
         start_time = parsed_intent['start_time']
-        if isinstance(start_time, str):
-            start_time = datetime.fromisoformat(start_time)
 
+        # Set default end time if not provided
         if parsed_intent.get('end_time'):
             end_time = parsed_intent['end_time']
-            if isinstance(end_time, str):
-                end_time = datetime.fromisoformat(end_time)
         else:
-            # Default: 1 hour duration
-            end_time = start_time.replace(hour=start_time.hour + 1)
+            # Default: 1 hour duration (timedelta so 23:xx rolls over to the next day)
+            end_time = start_time + timedelta(hours=1)
 
         # Create the event
         event_id = self.calendar_client.create_event(
@@ -151,27 +212,12 @@ class CalendarAgentDeepSeek:
 
     def _handle_read_events(self, parsed_intent: Dict, selected_calendar: str = None) -> str:
         """Handle event reading/listing"""
-        print(f"🔍 Reading events with parsed intent: {parsed_intent}")
+        log.debug("🔍 Reading events with parsed intent: %s", parsed_intent)
 
         # Determine time range for search
-        if parsed_intent.get('start_time'):
-            start_date = parsed_intent['start_time']
-            if isinstance(start_date, str):
-                start_date = datetime.fromisoformat(start_date)
-
-            # Use provided end_time if available, otherwise default to end of day
-            if parsed_intent.get('end_time'):
-                end_date = parsed_intent['end_time']
-                if isinstance(end_date, str):
-                    end_date = datetime.fromisoformat(end_date)
-            else:
-                end_date = start_date.replace(hour=23, minute=59, second=59)
-        else:
-            # Default to today
-            start_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            end_date = start_date.replace(hour=23, minute=59, second=59)
+        start_date, end_date = _read_range(parsed_intent)
 
-        print(f"🔍 Querying events from {start_date} to {end_date}")
+        log.debug("🔍 Querying events from %s to %s", start_date, end_date)
 
         # If searching for specific event
         if parsed_intent.get('title'):
@@ -189,29 +235,31 @@ class CalendarAgentDeepSeek:
         if not events:
             # Determine which day we're querying for the message
             query_date = start_date.date()
-            today = datetime.now().date()
+            start_of_today, _, tomorrow = _current_day_bounds()
 
-            if query_date == today:
+            if query_date == start_of_today.date():
                 return "📅 今天没有安排任何事件"
-            elif query_date == today.replace(day=today.day + 1):
+            elif query_date == tomorrow:
                 return "📅 明天没有安排任何事件"
             else:
                 return f"📅 {query_date.strftime('%Y年%m月%d日')} 没有安排任何事件"
 
-        response = "📅 您的日程安排:\n\n"
+        parts = [_RESP_HEADER_SCHEDULE]
         for i, event in enumerate(events, 1):
-            start_str = event['start'].strftime('%H:%M') if event['start'] else '未知时间'
-            end_str = event['end'].strftime('%H:%M') if event['end'] else '未知时间'
-
-            response += f"{i}. {event['title']}\n"
-            response += f"   时间: {start_str} - {end_str}\n"
+            event_view = {
+                'i': i,
+                'title': event['title'],
+                'start': event['start'].strftime('%H:%M') if event['start'] else '未知时间',
+                'end': event['end'].strftime('%H:%M') if event['end'] else '未知时间',
+            }
+            parts.append(_EVENT_LINE.format_map(event_view))
             if event.get('location'):
-                response += f"   地点: {event['location']}\n"
+                parts.append(_LOC_LINE.format_map(event))
             if event.get('description'):
-                response += f"   描述: {event['description']}\n"
-            response += "\n"
+                parts.append(_DESC_LINE.format_map(event))
+            parts.append("\n")
 
-        return response.strip()
+        return "".join(parts).strip()
 
     def _handle_update_event(self, parsed_intent: Dict, selected_calendar: str = None) -> str:
         """Handle event updates"""
@@ -244,7 +292,7 @@ class CalendarAgentDeepSeek:
 
     def _handle_delete_event(self, parsed_intent: Dict, selected_calendar: str = None) -> str:
         """Handle event deletion"""
-        print(f"尝试删除事件: {parsed_intent.get('target_event')}")
+        log.debug("尝试删除事件: %s", parsed_intent.get('target_event'))
 
         # Handle "all" target_event (delete all matching events)
         if parsed_intent.get('target_event') == 'all':
@@ -255,14 +303,14 @@ class CalendarAgentDeepSeek:
                     calendar_name=selected_calendar if selected_calendar is not None else None
                 )
                 if events:
-                    deleted_count = 0
-                    for event in events:
-                        print(f"找到事件，开始删除: {event['id']}")
-                        if self.calendar_client.delete_event(
-                            event['id'],
-                            calendar_name=selected_calendar if selected_calendar is not None else None
-                        ):
-                            deleted_count += 1
+                    # Occurrences of one recurring event share an id, delete it once
+                    event_ids = list(dict.fromkeys(str(event['id']) for event in events))
+                    log.debug("找到事件，开始删除: %s", event_ids)
+                    results = self.calendar_client.delete_events_bulk(
+                        event_ids,
+                        calendar_name=selected_calendar if selected_calendar is not None else None
+                    )
+                    deleted_count = sum(results)
 
                     if deleted_count > 0:
                         return f"✅ 已成功删除 {deleted_count} 个事件"
@@ -282,15 +330,15 @@ class CalendarAgentDeepSeek:
                     calendar_name=selected_calendar if selected_calendar is not None else None
                 )
                 if events:
-                    print(f"找到事件: {events}")
-                    deleted_count = 0
-                    for event in events:
-                        print(f"找到事件，开始删除: {event['id']}")
-                        if self.calendar_client.delete_event(
-                            event['id'],
-                            calendar_name=selected_calendar if selected_calendar is not None else None
-                        ):
-                            deleted_count += 1
+                    log.debug("找到事件: %s", events)
+                    # Occurrences of one recurring event share an id, delete it once
+                    event_ids = list(dict.fromkeys(str(event['id']) for event in events))
+                    log.debug("找到事件，开始删除: %s", event_ids)
+                    results = self.calendar_client.delete_events_bulk(
+                        event_ids,
+                        calendar_name=selected_calendar if selected_calendar is not None else None
+                    )
+                    deleted_count = sum(results)
 
                     if deleted_count > 0:
                         return f"✅ 已成功删除 {deleted_count} 个事件"
@@ -312,6 +360,35 @@ class CalendarAgentDeepSeek:
         else:
             return "❌ 删除事件失败，请检查事件ID是否正确"
 
+    def _handle_check_availability(self, parsed_intent: Dict, selected_calendar: str = None) -> str:
+        """Handle free/busy queries such as '明天下午有空吗'"""
+        if parsed_intent.get('start_time'):
+            start_time = parsed_intent['start_time']
+
+            if parsed_intent.get('end_time'):
+                end_time = parsed_intent['end_time']
+            else:
+                end_time = start_time.replace(hour=23, minute=59, second=59)
+        else:
+            # Default to today
+            start_time, end_time, _ = _current_day_bounds()
+
+        busy_ranges = self.calendar_client.get_busy_ranges(
+            start_time,
+            end_time,
+            calendar_name=selected_calendar if selected_calendar is not None else None
+        )
+
+        window = f"{start_time.strftime('%Y-%m-%d %H:%M')} - {end_time.strftime('%H:%M')}"
+        if not busy_ranges:
+            return f"✅ {window} 没有安排，时间空闲"
+
+        # Free-busy periods come back in UTC, show them in local time
+        lines = [f"⏰ {window} 以下时间段已有安排:"]
+        for busy_start, busy_end in busy_ranges:
+            lines.append(f"• {busy_start.astimezone().strftime('%H:%M')} - {busy_end.astimezone().strftime('%H:%M')}")
+        return "\n".join(lines)
+
     def get_calendar_list(self) -> List[str]:
         """Get list of available calendars"""
         calendars = self.calendar_client.get_calendars()
@@ -319,11 +396,18 @@ class CalendarAgentDeepSeek:
 
     def get_calendar_list_formatted(self) -> str:
         """Get formatted list of available calendars for display"""
-        calendars = self.calendar_client.get_calendars()
-        if calendars:
-            return "📋 可用日历:\n" + "\n".join([f"• {cal}" for cal in calendars])
-        else:
-            return "未找到可用的日历"
+        if self._calendar_list_formatted is None:
+            calendars = self.calendar_client.get_calendars()
+            if calendars:
+                self._calendar_list_formatted = "📋 可用日历:\n" + "\n".join([f"• {cal}" for cal in calendars])
+            else:
+                self._calendar_list_formatted = "未找到可用的日历"
+        return self._calendar_list_formatted
+
+    def refresh_calendars(self):
+        """Reload calendars from the server and drop the cached listing"""
+        self.calendar_client.refresh_calendars()
+        self._calendar_list_formatted = None
 
 # Example usage and testing
 def main():
@@ -352,4 +436,5 @@ def main():
         print("请编辑 config.json 文件，填写您的 Apple ID 和 DeepSeek API 密钥")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     main()
\ No newline at end of file
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Environment check for Calendar Agent
+Verifies that dependencies are installed and a config file exists, without importing them
+(config_loader only uses the standard library until a config file is actually read)
+"""
+
+import importlib.util
+import sys
+
+from config_loader import resolve_config_path
+
+# requirements.txt package -> importable module name
+DEPENDENCIES = {
+    'caldav': 'caldav',
+    'icalendar': 'icalendar',
+    'python-dateutil': 'dateutil',
+    'requests': 'requests',
+    'python-dotenv': 'dotenv',
+    'quart': 'quart',
+    'uvicorn': 'uvicorn',
+    'orjson': 'orjson',
+}
+
+def check_dependencies() -> bool:
+    """
+    Check that every dependency can be found
+
+    find_spec only locates the package on disk, it does not run its top-level code,
+    so this stays fast even for frameworks that import a lot on startup.
+    """
+    all_found = True
+    for package, module in DEPENDENCIES.items():
+        if importlib.util.find_spec(module) is not None:
+            print(f"✅ {package}")
+        else:
+            print(f"❌ {package} 未安装")
+            all_found = False
+    return all_found
+
+def check_config() -> bool:
+    """Check that config_private.json or config.json exists"""
+    try:
+        path, _ = resolve_config_path()
+    except FileNotFoundError as e:
+        print(f"❌ {e}")
+        return False
+    print(f"✅ 配置文件: {path}")
+    return True
+
+def main():
+    print("🔍 Checking environment")
+    print("=" * 50)
+
+    ok = check_dependencies()
+    ok = check_config() and ok
+
+    if not ok:
+        print("\n请运行 pip install -r requirements.txt 并创建配置文件")
+        sys.exit(1)
+    print("\n✅ 环境检查通过")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import logging
+import os
+from typing import Dict, Set, Tuple
+
+# Only the standard library at import time, so check_env.py can use resolve_config_path
+# before any dependency is known to be installed
+
+log = logging.getLogger(__name__)
+
+PRIVATE_CONFIG_PATH = 'config_private.json'
+DEFAULT_CONFIG_PATH = 'config.json'
+
+# Required fields as key paths into the config dict
+AGENT_REQUIRED_FIELDS = (('caldav', 'username'), ('caldav', 'password'), ('deepseek', 'api_key'))
+PARSER_REQUIRED_FIELDS = (('deepseek', 'api_key'),)
+
+# (path, mtime_ns) -> parsed config; only the current file version is kept
+_CONFIG_CACHE: Dict[Tuple[str, int], Dict] = {}
+
+# Required-field sets already checked against the cached config
+_VALIDATED: Set[Tuple[Tuple[str, ...], ...]] = set()
+
+def resolve_config_path() -> Tuple[str, os.stat_result]:
+    """Return the config file to use (config_private.json > config.json) and its stat result"""
+    for path in (PRIVATE_CONFIG_PATH, DEFAULT_CONFIG_PATH):
+        try:
+            return path, os.stat(path)
+        except FileNotFoundError:
+            continue
+
+    raise FileNotFoundError(
+        f"配置文件不存在，请创建 {PRIVATE_CONFIG_PATH} 或 {DEFAULT_CONFIG_PATH} 并填写配置信息"
+    )
+
+def validate_config(config: Dict, required: Tuple[Tuple[str, ...], ...]):
+    """Raise ValueError if any of the required key paths is missing or empty"""
+    for field in required:
+        current = config
+        for key in field:
+            if not isinstance(current, dict) or key not in current:
+                raise ValueError(f"配置文件中缺少必要字段: {'.'.join(field)}")
+            current = current[key]
+        if not current:
+            raise ValueError(f"配置字段 {'.'.join(field)} 不能为空")
+
+def load_config(required: Tuple[Tuple[str, ...], ...] = ()) -> Dict:
+    """
+    Load configuration with priority: config_private.json > config.json
+
+    The file is parsed once per version (path + mtime); later calls return the cached
+    dict, which is shared between callers and must not be modified. Each set of
+    required fields is validated once per parsed version.
+
+    Args:
+        required: Key paths that must be present and non-empty, e.g. AGENT_REQUIRED_FIELDS
+
+    Raises:
+        FileNotFoundError: Neither config file exists
+        ValueError: The file cannot be read or parsed, or a required field is missing
+    """
+    path, stat = resolve_config_path()
+    key = (path, stat.st_mtime_ns)
+
+    config = _CONFIG_CACHE.get(key)
+    if config is None:
+        config = _read_config(path)
+        _CONFIG_CACHE.clear()
+        _VALIDATED.clear()
+        _CONFIG_CACHE[key] = config
+
+    if required not in _VALIDATED:
+        validate_config(config, required)
+        _VALIDATED.add(required)
+
+    return config
+
+def _read_config(path: str) -> Dict:
+    """Read and parse a config file from disk"""
+    try:
+        import orjson
+    except ImportError:
+        # Same loads()/JSONDecodeError interface, just slower
+        import json as orjson
+
+    if path == PRIVATE_CONFIG_PATH:
+        log.info("使用私有配置文件: %s", path)
+    else:
+        log.info("使用默认配置文件: %s", path)
+
+    try:
+        with open(path, 'rb') as f:
+            config = orjson.loads(f.read())
+    except orjson.JSONDecodeError as e:
+        raise ValueError(f"配置文件格式错误: {e}")
+    except OSError as e:
+        raise ValueError(f"读取配置文件失败: {e}")
+
+    return config
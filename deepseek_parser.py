@@ -1,22 +1,200 @@
+import asyncio
+import copy
 import json
+import logging
 import os
+import re
+import threading
 import requests
-from typing import Dict, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:
+    import json as orjson
+
+from config_loader import PARSER_REQUIRED_FIELDS, load_config
+
+log = logging.getLogger(__name__)
+
+def _keyword_re(keywords):
+    """Compile a keyword list into one alternation so a single C-level scan finds any of them"""
+    return re.compile("|".join(map(re.escape, keywords)))
+
+# 时间词汇 (凌晨时段需要推理)
+_TIME_KEYWORDS_RE = _keyword_re([
+    '今天', '明天', '后天', '上午', '下午', '晚上', '凌晨', '早晨', '早上'
+])
+
+# 相对时间表达 (需要推理的)
+_RELATIVE_TIME_RE = _keyword_re([
+    '下周', '下个月', '下个星期',
+    '这周', '这个月', '这个星期',
+    '月底', '月初', '年中', '年底', '年初',
+    '工作日', '周末', '节假日', '假期'
+])
+
+# 具体日期表达 (不需要推理的)
+_SPECIFIC_DATE_RE = _keyword_re([
+    '下周一', '下周二', '下周三', '下周四', '下周五', '下周六', '下周日',
+    '这周一', '这周二', '这周三', '这周四', '这周五', '这周六', '这周日'
+])
+
+# 模糊时间表达
+_VAGUE_TIME_RE = _keyword_re([
+    '最近', '过几天', '几天后', '下周左右', '大概', '大约', '左右', '前后', '差不多'
+])
+
+# The YYYY-MM-DDTHH:MM:SS shape the system prompt asks for
+_ISO_RE = re.compile(r'^(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})$')
+
+@lru_cache(maxsize=256)
+def _parse_iso(value: str) -> datetime:
+    """
+    Parse an ISO timestamp from the model, memoized since it keeps returning the same day boundaries
+
+    The prompted shape is built directly; anything else (offsets, fractions, dates)
+    goes through datetime.fromisoformat.
+    """
+    match = _ISO_RE.match(value)
+    if match:
+        return datetime(*map(int, match.groups()))
+    return datetime.fromisoformat(value)
+
+# Parse results kept by parse_command, least recently used evicted first
+PARSE_CACHE_SIZE = 512
+
+# Commands sent in one parse_commands request; larger batches are split
+MAX_BATCH_SIZE = 20
+
+# Default bound on in-flight API calls from parse_commands_parallel; also the
+# size of the session's connection pool so each of them keeps its own connection
+MAX_CONCURRENT_REQUESTS = 10
+
+# Output budget per command; a parse result is well under 120 tokens
+MAX_OUTPUT_TOKENS = 150
+
+# Appended to the system prompt for parse_commands requests
+_BATCH_INSTRUCTION = """
+
+批量模式：CURRENT_TIME 行之后是 {"commands": ["指令1", "指令2", ...]} 形式的JSON。
+请逐条解析，返回 {"results": [...]}，results 与 commands 顺序一致、数量相同，每个元素的格式与单条指令相同。"""
+
+# Parse result for a command that could not be parsed; hand out copies only
+_EMPTY_RESULT_TEMPLATE = {
+    'intent': None,
+    'title': None,
+    'start_time': None,
+    'end_time': None,
+    'description': None,
+    'location': None,
+    'target_event': None
+}
+
+def _convert_times(parsed_data: Dict) -> Dict:
+    """Convert the ISO start_time/end_time strings of a parse result to datetime objects"""
+    if parsed_data.get('start_time'):
+        parsed_data['start_time'] = _parse_iso(parsed_data['start_time'])
+    if parsed_data.get('end_time'):
+        parsed_data['end_time'] = _parse_iso(parsed_data['end_time'])
+    return parsed_data
+
+# Finishes reading streamed responses after the JSON has been extracted
+_DRAIN_EXECUTOR = ThreadPoolExecutor(max_workers=2)
+
+class _ObjectEndTracker:
+    """
+    Follows brace depth across streamed chunks of a JSON object
+
+    Braces inside string values (and escaped quotes within them) are skipped, so
+    feed() reports the end exactly when the outermost object closes.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, text: str) -> bool:
+        """Consume the next chunk; True once the top-level object is closed"""
+        for ch in text:
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == '\\':
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == '{':
+                self.depth += 1
+            elif ch == '}':
+                self.depth -= 1
+                if self.depth == 0:
+                    return True
+        return False
+
+def _read_streamed_json(response) -> Dict:
+    """
+    Accumulate delta.content from a streamed (SSE) chat completion and decode it
+
+    Returns as soon as the outermost JSON object closes, without waiting for the rest
+    of the stream and the final [DONE] event. The text is decoded once, at that point.
+    """
+    parts = []
+    tracker = _ObjectEndTracker()
+    for line in response.iter_lines():
+        if not line.startswith(b"data:"):
+            continue
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            break
+
+        choices = orjson.loads(data).get("choices")
+        delta = choices[0].get("delta", {}).get("content") if choices else None
+        if not delta:
+            continue
+
+        parts.append(delta)
+        if tracker.feed(delta):
+            break
+
+    content = "".join(parts).strip()
+    log.debug("🧠 API Response: %s", content)
+    return orjson.loads(content)
+
+def _drain_response(response):
+    """Read a response to the end and close it, releasing its connection back to the pool"""
+    try:
+        for _ in response.iter_content(chunk_size=None):
+            pass
+    except Exception:
+        pass
+    finally:
+        response.close()
+
 class DeepSeekCalendarParser:
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, config: Dict = None):
         """
         Initialize DeepSeek parser for calendar commands
 
         Args:
-            api_key: DeepSeek API key. If None, will load from config.json
+            api_key: DeepSeek API key. If None, will be taken from the configuration
+            config: Already-loaded configuration. If None, will load from config.json
         """
         if api_key:
             self.api_key = api_key
         else:
-            # Load from config.json
-            config = self._load_config()
+            # Load from config.json unless the caller already has it
+            if config is None:
+                config = load_config(required=PARSER_REQUIRED_FIELDS)
             self.api_key = config['deepseek']['api_key']
 
         if not self.api_key:
@@ -24,120 +202,75 @@ class DeepSeekCalendarParser:
 
         self.api_url = "https://api.deepseek.com/v1/chat/completions"
 
+        # Keep-alive session so consecutive commands reuse the TLS connection;
+        # rate-limit and 5xx responses are retried with exponential backoff
+        self._session = requests.Session()
+        self._session.headers.update({
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        })
+        retries = Retry(
+            total=3,
+            backoff_factor=1.0,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=frozenset({"POST"})
+        )
+        self._session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=MAX_CONCURRENT_REQUESTS, max_retries=retries))
+
+        # (user_input, minute) -> parse result; the lock covers parse_commands_parallel threads
+        self._cache: "OrderedDict[tuple, Dict]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
         # System prompt for calendar parsing
-        self.system_prompt = """你是一个专业的日历助理，专门解析用户对日历事件的指令。
-
-请将用户的自然语言指令解析为结构化的JSON格式，包含以下字段：
-- intent: 操作意图 (create, read, update, delete)
-- title: 事件标题
-- start_time: 开始时间 (ISO格式: YYYY-MM-DDTHH:MM:SS)
-- end_time: 结束时间 (ISO格式: YYYY-MM-DDTHH:MM:SS)
-- description: 事件描述
-- location: 事件地点
-- target_event: 目标事件ID (用于更新/删除)
-
-时间解析规则：
-- 使用当前时间作为参考：{current_time}
-- 基于人类作息习惯合理判断"今天"和"明天"的含义
-- 凌晨时段（0-6点）的特殊处理：
-  - 如果用户在凌晨说"今天"，通常指的是已经开始的这一天
-  - 如果用户在凌晨说"明天"，通常指的是即将到来的白天（即今天白天）
-  - 如果用户在凌晨说"后天"，通常指的是24小时后的白天
-- 对于查询指令（如"明天有什么事"）：
-  - 必须提供准确的start_time和end_time
-  - "明天"：start_time = 明天00:00:00，end_time = 明天23:59:59
-  - "今天"：start_time = 今天00:00:00，end_time = 今天23:59:59
+        self.system_prompt = """你是日历助理，把用户的日历指令解析为JSON，字段：
+- intent: create / read / update / delete / availability
+- title, description, location: 事件标题、描述、地点
+- start_time, end_time: ISO格式 YYYY-MM-DDTHH:MM:SS
+- target_event: 目标事件ID (更新/删除)
+未提及的字段为 null。
+
+用户消息第一行 CURRENT_TIME=YYYY-MM-DDTHH:MM:SS 是当前时间：
+- 凌晨(0-6点)说"今天"指已开始的这一天，"明天"指即将到来的白天，"后天"指24小时后的白天
+- 查询和空闲指令必须给出 start_time 和 end_time，如"明天" = 明天00:00:00 至 23:59:59
 - "下周" = 当前日期 + 7天
-- 对于创建指令，如果没有指定时间，默认为当前时间+1小时开始，持续1小时
-
-意图识别：
-- create: 创建、添加、安排、预定、新建
-- read: 查看、显示、列出、检查、看看、有什么事、日程安排
-- update: 更新、修改、改变、调整、重新安排
-- delete: 删除、取消、移除
+- 创建指令未指定时间时，从当前时间+1小时开始，持续1小时
 
-重要：对于查询类指令（如"明天有什么事"），必须提供准确的时间范围，不能留空。
+意图：
+- create: 创建/添加/安排/预定
+- read: 查看/显示/列出/有什么事
+- update: 更新/修改/调整/重新安排
+- delete: 删除/取消/移除
+- availability: 有空吗/空闲/忙不忙
 
-返回格式必须是纯JSON，不要有其他文本。"""
+只返回JSON。"""
 
-    def _load_config(self) -> Dict:
-        """Load configuration with priority: config_private.json > config.json"""
-        # Try config_private.json first (private config)
-        private_config_path = 'config_private.json'
-        config_path = 'config.json'
-
-        if os.path.exists(private_config_path):
-            config_path = private_config_path
-            print(f"使用私有配置文件: {config_path}")
-        elif os.path.exists(config_path):
-            print(f"使用默认配置文件: {config_path}")
-        else:
-            raise FileNotFoundError(
-                f"配置文件不存在，请创建 {private_config_path} 或 {config_path} 并填写配置信息"
-            )
-
-        try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config = json.load(f)
+        # The system prompts stay byte-identical across calls (the time goes in the user
+        # message), so DeepSeek's prefix cache can serve their prefill
+        self._batch_system_prompt = self.system_prompt + _BATCH_INSTRUCTION
 
-            # Validate required fields
-            if 'deepseek' not in config or 'api_key' not in config['deepseek']:
-                raise ValueError("配置文件中缺少 deepseek.api_key 字段")
-
-            if not config['deepseek']['api_key']:
-                raise ValueError("配置字段 deepseek.api_key 不能为空")
-
-            return config
-
-        except json.JSONDecodeError as e:
-            raise ValueError(f"配置文件格式错误: {e}")
-        except Exception as e:
-            raise ValueError(f"读取配置文件失败: {e}")
-
-    def _should_enable_reasoning(self, user_input: str) -> bool:
+    def _should_enable_reasoning(self, user_input: str, now: datetime) -> bool:
         """
         Determine whether to enable reasoning mode based on input complexity and time
 
+        Args:
+            user_input: User's natural language command
+            now: The request's current time, taken once by the caller
+
         Returns:
             True if reasoning mode should be enabled
         """
-        from datetime import datetime
-
-        current_hour = datetime.now().hour
+        current_hour = now.hour
 
         # 凌晨时段 (0-6点) 且包含时间词汇
-        if 0 <= current_hour <= 6:
-            time_keywords = ['今天', '明天', '后天', '上午', '下午', '晚上', '凌晨', '早晨', '早上']
-            if any(keyword in user_input for keyword in time_keywords):
-                return True
-
-        # 相对时间表达 (需要推理的)
-        relative_time_patterns = [
-            '下周', '下个月', '下个星期',
-            '这周', '这个月', '这个星期',
-            '月底', '月初', '年中', '年底', '年初',
-            '工作日', '周末', '节假日', '假期'
-        ]
-
-        # 具体日期表达 (不需要推理的)
-        specific_date_patterns = [
-            '下周一', '下周二', '下周三', '下周四', '下周五', '下周六', '下周日',
-            '这周一', '这周二', '这周三', '这周四', '这周五', '这周六', '这周日'
-        ]
+        if 0 <= current_hour <= 6 and _TIME_KEYWORDS_RE.search(user_input):
+            return True
 
         # 检查是否有相对时间表达但排除具体日期
-        has_relative_time = any(pattern in user_input for pattern in relative_time_patterns)
-        has_specific_date = any(pattern in user_input for pattern in specific_date_patterns)
-
-        if has_relative_time and not has_specific_date:
+        if _RELATIVE_TIME_RE.search(user_input) and not _SPECIFIC_DATE_RE.search(user_input):
             return True
 
         # 模糊时间表达
-        vague_time_patterns = [
-            '最近', '过几天', '几天后', '下周左右', '大概', '大约', '左右', '前后', '差不多'
-        ]
-
-        if any(pattern in user_input for pattern in vague_time_patterns):
+        if _VAGUE_TIME_RE.search(user_input):
             return True
 
         return False
@@ -146,87 +279,182 @@ class DeepSeekCalendarParser:
         """
         Parse natural language command using DeepSeek API
 
+        Identical commands within the same minute are answered from a local LRU cache.
+        The key uses the minute rather than the date because relative times such as
+        "一小时后" move with the clock, not just across midnight. Failed parses
+        (intent None) are not cached so the next attempt calls the API again.
+
         Args:
             user_input: User's natural language command
 
         Returns:
-            Parsed command as dictionary
+            Parsed command as dictionary; start_time and end_time are always
+            datetime objects or None, never ISO strings
         """
-        current_time = datetime.now().isoformat()
-        system_prompt = self.system_prompt.format(current_time=current_time)
-        print(f"🧠 Parsing command: {user_input}")
+        # One clock read per request: the cache bucket and the prompt's CURRENT_TIME agree
+        now = datetime.now().replace(second=0, microsecond=0)
+        key = (user_input, now)
+
+        with self._cache_lock:
+            parsed_data = self._cache.get(key)
+            if parsed_data is not None:
+                self._cache.move_to_end(key)
+
+        if parsed_data is None:
+            parsed_data = self._parse_uncached(user_input, now)
+            if parsed_data.get('intent') is None:
+                return parsed_data
+
+            with self._cache_lock:
+                self._cache[key] = parsed_data
+                if len(self._cache) > PARSE_CACHE_SIZE:
+                    self._cache.popitem(last=False)
+
+        # Values are str/datetime/None, so a shallow copy keeps callers off the cached entry
+        return copy.copy(parsed_data)
+
+    def _parse_uncached(self, user_input: str, now: datetime) -> Dict:
+        """Call the DeepSeek API and convert its JSON reply; now is the minute-rounded request time"""
+        current_time = now.isoformat()
+        log.debug("🧠 Parsing command: %s", user_input)
 
         try:
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}"
+            payload = {
+                "model": "deepseek-chat",
+                "messages": [
+                    {"role": "system", "content": self.system_prompt},
+                    {"role": "user", "content": f"CURRENT_TIME={current_time}\n{user_input}"}
+                ],
+                "temperature": 0.1,
+                "max_tokens": MAX_OUTPUT_TOKENS,
+                "response_format": {"type": "json_object"},
+                "stream": True
             }
 
+            # 只在需要时启用推理模式
+            if self._should_enable_reasoning(user_input, now):
+                payload["reasoning_effort"] = "medium"
+                log.debug("🔍 启用深度推理模式")
+
+            response = self._session.post(self.api_url, json=payload, timeout=30, stream=True)
+            try:
+                response.raise_for_status()
+                # response_format=json_object guarantees the content is a single JSON object
+                parsed_data = _read_streamed_json(response)
+            finally:
+                # Finish reading in the background so the connection returns to the pool
+                _DRAIN_EXECUTOR.submit(_drain_response, response)
+
+            # Convert string dates to datetime objects
+            _convert_times(parsed_data)
+
+            log.debug("🧠 Final parsed data: %s", parsed_data)
+            return parsed_data
+
+        except Exception as e:
+            log.error("DeepSeek API error: %s", e)
+            # Return empty structure on error
+            return _EMPTY_RESULT_TEMPLATE.copy()
+
+    def parse_commands(self, inputs: List[str]) -> List[Dict]:
+        """
+        Parse several commands, up to MAX_BATCH_SIZE per DeepSeek request
+
+        One request per batch replaces one round trip (and one system prompt prefill)
+        per command. A single command goes through parse_command and its cache.
+
+        Args:
+            inputs: User commands
+
+        Returns:
+            One parse result per input, in the same order, as returned by parse_command
+        """
+        if len(inputs) <= 1:
+            return [self.parse_command(user_input) for user_input in inputs]
+
+        results = []
+        for i in range(0, len(inputs), MAX_BATCH_SIZE):
+            results.extend(self._parse_batch(inputs[i:i + MAX_BATCH_SIZE]))
+        return results
+
+    def _parse_batch(self, batch: List[str]) -> List[Dict]:
+        """Parse one batch of commands with a single API call"""
+        now = datetime.now().replace(second=0, microsecond=0)
+        current_time = now.isoformat()
+        commands = json.dumps({"commands": batch}, ensure_ascii=False)
+        log.debug("🧠 Parsing %d commands in one request", len(batch))
+
+        try:
             payload = {
                 "model": "deepseek-chat",
                 "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_input}
+                    {"role": "system", "content": self._batch_system_prompt},
+                    {"role": "user", "content": f"CURRENT_TIME={current_time}\n{commands}"}
                 ],
                 "temperature": 0.1,
-                "max_tokens": 500,
-                "stream": False
+                "max_tokens": MAX_OUTPUT_TOKENS * len(batch),
+                "response_format": {"type": "json_object"}
             }
 
-            # 只在需要时启用推理模式
-            if self._should_enable_reasoning(user_input):
+            if any(self._should_enable_reasoning(user_input, now) for user_input in batch):
                 payload["reasoning_effort"] = "medium"
-                print("🔍 启用深度推理模式")  # 调试信息
+                log.debug("🔍 启用深度推理模式")
 
-            response = requests.post(self.api_url, headers=headers, json=payload, timeout=30)
+            response = self._session.post(self.api_url, json=payload, timeout=60)
             response.raise_for_status()
+            content = orjson.loads(response.content)['choices'][0]['message']['content']
+            log.debug("🧠 API Response: %s", content)
+            items = orjson.loads(content).get('results') or []
 
-            data = response.json()
-            content = data["choices"][0]["message"]["content"].strip()
-            print(f"🧠 API Response: {content}")
+        except Exception as e:
+            log.error("DeepSeek API error: %s", e)
+            items = []
+
+        if len(items) != len(batch):
+            log.warning("批量解析返回 %d 条结果，预期 %d 条", len(items), len(batch))
+
+        results = []
+        for i in range(len(batch)):
+            item = items[i] if i < len(items) else None
+            if not isinstance(item, dict):
+                results.append(_EMPTY_RESULT_TEMPLATE.copy())
+                continue
+            try:
+                results.append(_convert_times(item))
+            except (TypeError, ValueError) as e:
+                log.error("DeepSeek API error: %s", e)
+                results.append(_EMPTY_RESULT_TEMPLATE.copy())
+        return results
+
+    async def parse_command_async(self, user_input: str) -> Dict:
+        """
+        Async variant of parse_command
 
-            # Try to find JSON in the response
-            json_start = content.find('{')
-            json_end = content.rfind('}') + 1
+        The blocking HTTP call runs in the event loop's default executor, so callers can
+        overlap it with other I/O (e.g. CalDAV reads) instead of waiting in sequence.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.parse_command, user_input)
 
-            if json_start >= 0 and json_end > json_start:
-                json_str = content[json_start:json_end]
-                print(f"🧠 Extracted JSON: {json_str}")
-                parsed_data = json.loads(json_str)
+    async def parse_commands_parallel(self, inputs: List[str],
+                                      max_concurrency: int = MAX_CONCURRENT_REQUESTS) -> List[Dict]:
+        """
+        Parse several commands as independent, concurrent requests
 
-                # Convert string dates to datetime objects
-                if parsed_data.get('start_time'):
-                    parsed_data['start_time'] = datetime.fromisoformat(parsed_data['start_time'])
-                if parsed_data.get('end_time'):
-                    parsed_data['end_time'] = datetime.fromisoformat(parsed_data['end_time'])
+        Unlike parse_commands each command gets its own prompt, so results match
+        parse_command exactly; at most max_concurrency requests are in flight, which
+        keeps bursts under the provider's rate limit (429s are still retried by the session).
 
-                print(f"🧠 Final parsed data: {parsed_data}")
-                return parsed_data
-            else:
-                print(f"❌ No JSON found in response")
-                # Fallback: return basic structure
-                return {
-                    'intent': None,
-                    'title': None,
-                    'start_time': None,
-                    'end_time': None,
-                    'description': None,
-                    'location': None,
-                    'target_event': None
-                }
+        Returns:
+            One parse result per input, in the same order
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
 
-        except Exception as e:
-            print(f"DeepSeek API error: {e}")
-            # Return empty structure on error
-            return {
-                'intent': None,
-                'title': None,
-                'start_time': None,
-                'end_time': None,
-                'description': None,
-                'location': None,
-                'target_event': None
-            }
+        async def parse_one(user_input: str) -> Dict:
+            async with semaphore:
+                return await self.parse_command_async(user_input)
+
+        return list(await asyncio.gather(*(parse_one(user_input) for user_input in inputs)))
 
 # Test function
 def test_deepseek_parsing():
@@ -254,14 +482,26 @@ def test_deepseek_parsing():
     print("🧪 Testing DeepSeek Parser")
     print("=" * 50)
 
+    # One streamed request per command: the path the app uses
+    results = []
     for cmd in test_commands:
         print(f"\n📝 Input: {cmd}")
         result = parser.parse_command(cmd)
+        results.append(result)
         print(f"🎯 Intent: {result.get('intent', 'None')}")
         print(f"📋 Details:")
         for key, value in result.items():
             if key not in ['intent'] and value:
                 print(f"   - {key}: {value}")
 
+    # All commands in one batch request, compared with the single-command results
+    print("\n🧪 Batch parsing (parse_commands)")
+    print("=" * 50)
+    batch_results = parser.parse_commands(test_commands)
+    for cmd, single, batch in zip(test_commands, results, batch_results):
+        mark = "✅" if single.get('intent') == batch.get('intent') else "⚠️"
+        print(f"{mark} {cmd}: {single.get('intent')} / {batch.get('intent')}")
+
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     test_deepseek_parsing()
\ No newline at end of file
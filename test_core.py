@@ -0,0 +1,527 @@
+#!/usr/bin/env python3
+"""
+Offline checks for Calendar Agent helpers
+Covers the pure logic behind the parser, config loader and CalDAV client; no network or credentials needed
+"""
+
+import asyncio
+from datetime import date, datetime, timedelta
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from caldav.elements import dav
+from caldav.lib import error as caldav_error
+from icalendar import Calendar, Event
+
+from deepseek_parser import _ObjectEndTracker, _read_streamed_json
+from caldav_client import _month_chunks
+import config_loader
+from deepseek_parser import DeepSeekCalendarParser
+from caldav_client import AppleCalendarClient
+import calendar_agent_deepseek
+import deepseek_parser
+
+def _feed_chunks(text: str, size: int) -> list:
+    """Feed text to a fresh tracker in chunks of size, returning feed() results"""
+    tracker = _ObjectEndTracker()
+    return [tracker.feed(text[i:i + size]) for i in range(0, len(text), size)]
+
+def test_object_end_tracker():
+    """The object ends exactly at its closing brace, whatever the chunking"""
+    text = '{"title": "a}b\\"{c\\\\", "nested": {"x": [1, {"y": "}"}]}}'
+    for size in (1, 2, 5, len(text)):
+        results = _feed_chunks(text, size)
+        assert results[-1] is True, size
+        assert results.count(True) == 1, size
+
+    # Still open: the } is inside a string value
+    assert _feed_chunks('{"a": "}', 1)[-1] is False
+
+class _FakeStream:
+    """Stands in for a streamed requests response"""
+
+    def __init__(self, deltas, trailing=()):
+        self.lines = [b'data: ' + _delta_event(d) for d in deltas] + list(trailing)
+        self.read = 0
+
+    def iter_lines(self):
+        for line in self.lines:
+            self.read += 1
+            yield line
+
+def _delta_event(content: str) -> bytes:
+    import json
+    return json.dumps({"choices": [{"delta": {"content": content}}]}).encode()
+
+def test_read_streamed_json_stops_at_object_end():
+    """Returns once the object closes, without reading the rest of the stream"""
+    response = _FakeStream(['{"intent": "read", ', '"title": "x}"', '}'],
+                           trailing=[b'data: ' + _delta_event(' '), b'data: [DONE]'])
+    assert _read_streamed_json(response) == {"intent": "read", "title": "x}"}
+    assert response.read == 3
+
+def test_month_chunks():
+    """Windows never cross a month boundary, including the December rollover"""
+    chunks = _month_chunks(datetime(2025, 11, 15), datetime(2026, 2, 10))
+    assert chunks == [
+        (datetime(2025, 11, 15), datetime(2025, 12, 1)),
+        (datetime(2025, 12, 1), datetime(2026, 1, 1)),
+        (datetime(2026, 1, 1), datetime(2026, 2, 1)),
+        (datetime(2026, 2, 1), datetime(2026, 2, 10)),
+    ]
+    assert _month_chunks(datetime(2025, 3, 2), datetime(2025, 3, 5)) == [
+        (datetime(2025, 3, 2), datetime(2025, 3, 5))
+    ]
+
+class _ConfigDir:
+    """Run load_config against config files in a temporary working directory"""
+
+    def __enter__(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        config_loader._CONFIG_CACHE.clear()
+        config_loader._VALIDATED.clear()
+        return self
+
+    def write(self, text: str, path: str = config_loader.DEFAULT_CONFIG_PATH, bump_mtime: bool = False):
+        with open(path, 'w') as f:
+            f.write(text)
+        if bump_mtime:
+            # Make the new version visible even on filesystems with coarse mtimes
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    def __exit__(self, *exc):
+        config_loader._CONFIG_CACHE.clear()
+        config_loader._VALIDATED.clear()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+def test_load_config_parsed_once_per_version():
+    """The same dict comes back until the file's mtime changes; the private file wins"""
+    with _ConfigDir() as configs:
+        configs.write('{"deepseek": {"api_key": "k1"}}')
+        first = config_loader.load_config()
+        assert config_loader.load_config() is first
+
+        configs.write('{"deepseek": {"api_key": "k2"}}', bump_mtime=True)
+        assert config_loader.load_config()['deepseek']['api_key'] == 'k2'
+
+        configs.write('{"deepseek": {"api_key": "private"}}', path=config_loader.PRIVATE_CONFIG_PATH)
+        assert config_loader.load_config()['deepseek']['api_key'] == 'private'
+
+def test_load_config_validates_each_field_set_once():
+    """Each required-field set is checked once per version; missing fields raise ValueError"""
+    real_validate = config_loader.validate_config
+    calls = []
+
+    def counting_validate(config, required):
+        calls.append(required)
+        real_validate(config, required)
+
+    config_loader.validate_config = counting_validate
+    try:
+        with _ConfigDir() as configs:
+            configs.write('{"deepseek": {"api_key": "k1"}}')
+            config_loader.load_config(required=config_loader.PARSER_REQUIRED_FIELDS)
+            config_loader.load_config(required=config_loader.PARSER_REQUIRED_FIELDS)
+            assert calls == [config_loader.PARSER_REQUIRED_FIELDS]
+
+            try:
+                config_loader.load_config(required=config_loader.AGENT_REQUIRED_FIELDS)
+                assert False, "missing caldav fields must raise"
+            except ValueError:
+                pass
+
+            configs.write('{"deepseek": {"api_key": ""}}', bump_mtime=True)
+            try:
+                config_loader.load_config(required=config_loader.PARSER_REQUIRED_FIELDS)
+                assert False, "an empty api_key must raise"
+            except ValueError:
+                pass
+            assert calls.count(config_loader.PARSER_REQUIRED_FIELDS) == 2
+    finally:
+        config_loader.validate_config = real_validate
+
+def test_parse_cache_skips_failures():
+    """Successful parses are reused within the minute, failed ones are retried"""
+    parser = DeepSeekCalendarParser(api_key='test')
+    replies = iter([
+        {'intent': None},
+        {'intent': 'read', 'title': None},
+    ])
+    calls = []
+
+    def fake_parse(user_input, now):
+        calls.append(user_input)
+        return next(replies)
+
+    parser._parse_uncached = fake_parse
+
+    assert parser.parse_command("查看今天的日程")['intent'] is None
+    first = parser.parse_command("查看今天的日程")
+    first['title'] = 'changed by caller'
+    second = parser.parse_command("查看今天的日程")
+
+    assert second == {'intent': 'read', 'title': None}
+    assert len(calls) == 2
+
+def test_should_enable_reasoning():
+    """Early-morning time words and vague expressions need reasoning, plain commands do not"""
+    parser = DeepSeekCalendarParser(api_key='test')
+    night = datetime(2025, 1, 1, 2, 0)
+    noon = datetime(2025, 1, 1, 12, 0)
+
+    assert parser._should_enable_reasoning("明天下午开会", night)
+    assert not parser._should_enable_reasoning("明天下午开会", noon)
+    assert parser._should_enable_reasoning("过几天安排一下", noon)
+    assert not parser._should_enable_reasoning("下周一上午10点开会", noon)
+
+def _bare_client(**attrs) -> AppleCalendarClient:
+    """AppleCalendarClient without a server connection, with just the given attributes set"""
+    client = AppleCalendarClient.__new__(AppleCalendarClient)
+    client.__dict__.update(attrs)
+    return client
+
+def test_find_event_passes_url_objects_to_multiget():
+    """multiget gets the URL object from children(), not the id string"""
+    from caldav.lib.url import URL
+
+    class FakeCalendar:
+        def children(self):
+            return [(URL.objectify("https://example.com/cal/1.ics"), None, None)]
+
+        def multiget(self, urls):
+            return [url.path for url in urls]
+
+    client = _bare_client()
+    calendar = FakeCalendar()
+    assert client._find_event("https://example.com/cal/1.ics", [calendar]) == (calendar, "/cal/1.ics")
+    assert client._find_event("https://example.com/cal/2.ics", [calendar]) == (None, None)
+
+def _cache_client(ttl: int = 120) -> AppleCalendarClient:
+    """_bare_client with just its read cache set up"""
+    return _bare_client(_cache_ttl=ttl, _events_cache={}, _cache_lock=threading.Lock(), _cache_generation=0)
+
+def test_events_cache_drops_fill_that_overlaps_a_write():
+    """A read that started before an invalidation is not cached; later reads are"""
+    client = _cache_client()
+    key = ('events', 'Home', 1, 2)
+
+    generation = client._cache_generation_now()
+    client.invalidate_cache('Home')
+    client._cache_set(key, [{'title': 'stale'}], generation)
+    assert client._cache_get(key) is None
+
+    client._cache_set(key, [{'title': 'fresh'}], client._cache_generation_now())
+    assert client._cache_get(key) == [{'title': 'fresh'}]
+
+    client.invalidate_cache('Home')
+    assert client._cache_get(key) is None
+
+def test_events_cache_off_by_default():
+    """Without cache.events_ttl nothing is stored"""
+    import inspect
+    assert inspect.signature(AppleCalendarClient).parameters['cache_ttl'].default == 0
+
+    client = _cache_client(ttl=0)
+    client._cache_set(('events', 'Home', 1, 2), [], client._cache_generation_now())
+    assert not client.cache_enabled
+    assert client._cache_get(('events', 'Home', 1, 2)) is None
+
+def test_prefetch_awaited_only_for_todays_listing():
+    """The speculative read of today is waited for only when the command reads today"""
+    start_of_day, end_of_day, _ = calendar_agent_deepseek._current_day_bounds()
+    tomorrow = start_of_day + timedelta(days=1)
+
+    class FakeParser:
+        async def parse_command_async(self, user_input):
+            return dict(intents[user_input])
+
+    class FakeClient:
+        cache_enabled = True
+
+    intents = {
+        'today': {'intent': 'read', 'title': None, 'start_time': None},
+        'today explicit': {'intent': 'read', 'title': None, 'start_time': start_of_day, 'end_time': end_of_day},
+        'tomorrow': {'intent': 'read', 'title': None, 'start_time': tomorrow},
+        'search': {'intent': 'read', 'title': '开会', 'start_time': None},
+    }
+    agent = calendar_agent_deepseek.CalendarAgentDeepSeek.__new__(calendar_agent_deepseek.CalendarAgentDeepSeek)
+    agent.nlp_parser = FakeParser()
+    agent.calendar_client = FakeClient()
+    done = []
+
+    def slow_prefetch(start_date, end_date, selected_calendar=None):
+        time.sleep(0.2)
+        done.append((start_date, end_date))
+
+    agent._prefetch_events = slow_prefetch
+    agent._execute_intent = lambda parsed_intent, user_input, selected_calendar=None: bool(done)
+
+    for user_input, waited in (('today', True), ('today explicit', True), ('tomorrow', False), ('search', False)):
+        done.clear()
+        assert asyncio.run(agent.process_command_async(user_input)) is waited, user_input
+
+class _FakeEvent:
+    """Stands in for a caldav.Event: a url plus its VEVENT"""
+
+    def __init__(self, url: str, summary: str, description: str = ''):
+        self.url = url
+        self.icalendar_component = Event()
+        self.icalendar_component.add('summary', summary)
+        if description:
+            self.icalendar_component.add('description', description)
+
+def test_search_events_filters_what_the_server_returns():
+    """Matches are re-checked locally, so a server that ignores text-match cannot return everything"""
+    class FakeCalendar:
+        name = 'Home'
+
+    events = [_FakeEvent('1.ics', '团队周会'), _FakeEvent('2.ics', 'Lunch', description='周会后吃饭'),
+              _FakeEvent('3.ics', '看牙医')]
+    client = _cache_client(ttl=0)
+    client.calendars = [FakeCalendar()]
+    client._text_match_search = lambda calendar, prop, query, start, end: events
+
+    assert [e['id'] for e in client.search_events('周会')] == ['1.ics', '2.ics']
+    assert [e['id'] for e in client.search_events('LUNCH')] == ['2.ics']
+
+def test_search_events_falls_back_on_any_dav_error():
+    """A refused text-match query (e.g. 403) falls back to a date search instead of returning nothing"""
+    class FakeCalendar:
+        name = 'Home'
+
+    def refused(calendar, prop, query, start, end):
+        raise caldav_error.AuthorizationError('403 Forbidden')
+
+    client = _cache_client(ttl=0)
+    client.calendars = [FakeCalendar()]
+    client._text_match_search = refused
+    client._date_search_chunked = lambda calendar, start, end: [_FakeEvent('1.ics', '周会'), _FakeEvent('2.ics', '看牙医')]
+
+    assert [e['id'] for e in client.search_events('周会')] == ['1.ics']
+
+class _FakeStoredEvent:
+    """A caldav.Event as loaded from the server, with an ETag in its props or behind get_property"""
+
+    def __init__(self, etag_in_props: bool = True, **props):
+        self.url = 'https://example.com/cal/1.ics'
+        self.icalendar_instance = Calendar()
+        self.icalendar_component = Event()
+        for name, value in props.items():
+            self.icalendar_component.add(name, value)
+        self.icalendar_instance.add_component(self.icalendar_component)
+        self.props = {dav.GetEtag.tag: '"v1"'} if etag_in_props else {}
+        self.property_lookups = 0
+
+    def get_property(self, prop):
+        self.property_lookups += 1
+        return '"v2"'
+
+class _FakeDAVClient:
+    def __init__(self, status: int = 204):
+        self.status = status
+        self.puts = []
+
+    def put(self, url, body, headers):
+        self.puts.append((url, Calendar.from_ical(body).walk('VEVENT')[0], headers))
+        return type('Response', (), {'status': self.status})()
+
+def _update_client(event, status: int = 204) -> AppleCalendarClient:
+    client = _cache_client()
+    client.client = _FakeDAVClient(status)
+    client._load_event = lambda event_id, calendar_name=None: (None, event)
+    return client
+
+def test_update_event_skips_put_when_nothing_changes():
+    """Passing the stored values again sends nothing"""
+    event = _FakeStoredEvent(summary='周会', dtstart=datetime(2025, 1, 1, 9), dtend=datetime(2025, 1, 1, 10))
+    client = _update_client(event)
+    assert client.update_event('1', title='周会', start_time=datetime(2025, 1, 1, 9))
+    assert client.client.puts == []
+
+def test_update_event_sends_if_match_and_reports_412():
+    """The PUT is conditional on the stored ETag; a 412 means someone else changed the event"""
+    event = _FakeStoredEvent(summary='周会', dtstart=datetime(2025, 1, 1, 9), dtend=datetime(2025, 1, 1, 10))
+    client = _update_client(event, status=412)
+    assert not client.update_event('1', title='改名')
+    assert client.client.puts[0][2]['If-Match'] == '"v1"'
+    assert event.property_lookups == 0
+
+    # No ETag came with the listing: ask the server for it
+    event = _FakeStoredEvent(etag_in_props=False, summary='周会', dtstart=datetime(2025, 1, 1, 9))
+    client = _update_client(event)
+    assert client.update_event('1', title='改名')
+    assert client.client.puts[0][2]['If-Match'] == '"v2"'
+
+def test_update_event_moves_end_with_start():
+    """A new start keeps the stored length; DURATION events never get a DTEND"""
+    event = _FakeStoredEvent(summary='周会', dtstart=datetime(2025, 1, 1, 9), dtend=datetime(2025, 1, 1, 10, 30))
+    client = _update_client(event)
+    assert client.update_event('1', start_time=datetime(2025, 1, 2, 14))
+    sent = client.client.puts[0][1]
+    assert sent['dtstart'].dt == datetime(2025, 1, 2, 14)
+    assert sent['dtend'].dt == datetime(2025, 1, 2, 15, 30)
+
+    event = _FakeStoredEvent(summary='周会', dtstart=datetime(2025, 1, 1, 9), duration=timedelta(hours=1))
+    client = _update_client(event)
+    assert client.update_event('1', start_time=datetime(2025, 1, 2, 14), end_time=datetime(2025, 1, 2, 16))
+    sent = client.client.puts[0][1]
+    assert 'dtend' not in sent
+    assert sent['duration'].dt == timedelta(hours=2)
+
+def test_busy_ranges_fall_back_to_events():
+    """Without a usable VFREEBUSY reply, busy ranges come from the events, all-day ones included"""
+    class RefusingCalendar:
+        def freebusy_request(self, start, end):
+            raise caldav_error.ReportError('501 Not Implemented')
+
+    class GarbledCalendar:
+        def freebusy_request(self, start, end):
+            # A 200 reply whose body is not a VFREEBUSY
+            return type('FreeBusy', (), {'icalendar_component': None})()
+
+    events = [
+        {'start': datetime(2025, 1, 2, 9), 'end': datetime(2025, 1, 2, 10)},
+        {'start': date(2025, 1, 1), 'end': date(2025, 1, 2)},
+        {'start': date(2025, 1, 3), 'end': None},
+        {'start': datetime(2025, 1, 2, 12), 'end': None},
+    ]
+    local = lambda *args: datetime(*args).astimezone()
+
+    for calendar in (RefusingCalendar(), GarbledCalendar()):
+        client = _bare_client(calendars=[calendar])
+        client.get_events = lambda start, end, calendar_name=None: events
+        assert client.get_busy_ranges(datetime(2025, 1, 1), datetime(2025, 1, 4)) == [
+            (local(2025, 1, 1), local(2025, 1, 2)),
+            (local(2025, 1, 2, 9), local(2025, 1, 2, 10)),
+            (local(2025, 1, 3), local(2025, 1, 4)),
+        ]
+
+def test_get_agent_backs_off_after_a_failure():
+    """A failed initialization is not retried on every request, only after the backoff"""
+    import app
+
+    attempts = []
+
+    class FailingAgent:
+        def __init__(self):
+            attempts.append(time.monotonic())
+            raise ValueError('日历代理初始化失败')
+
+    real_agent, real_clock = app.CalendarAgentDeepSeek, app.time.monotonic
+    now = [1000.0]
+    app.CalendarAgentDeepSeek = FailingAgent
+    app.time.monotonic = lambda: now[0]
+    try:
+        app._agent, app._agent_failed_at = None, None
+        assert app.get_agent() is None
+        assert app.get_agent() is None
+        assert len(attempts) == 1
+
+        now[0] += app.AGENT_RETRY_BACKOFF
+        app.CalendarAgentDeepSeek = object
+        built = app.get_agent()
+        assert built is not None
+        assert app._current_agent() is built and app.get_agent() is built
+    finally:
+        app.CalendarAgentDeepSeek, app.time.monotonic = real_agent, real_clock
+        app._agent, app._agent_failed_at = None, None
+
+def test_today_bounds_at_month_end():
+    """Tomorrow rolls over into the next month and year instead of reusing the day number"""
+    for now, tomorrow in ((datetime(2025, 1, 31, 15, 0), date(2025, 2, 1)),
+                          (datetime(2025, 12, 31, 23, 59), date(2026, 1, 1))):
+        start_of_day, end_of_day, next_day = calendar_agent_deepseek._today_bounds(int(now.timestamp() // 60))
+        assert start_of_day == now.replace(hour=0, minute=0)
+        assert end_of_day == now.replace(hour=23, minute=59, second=59)
+        assert next_day == tomorrow
+
+def test_default_end_rolls_over_midnight():
+    """A 23:xx start without an end gets one hour, ending on the next day (and month)"""
+    created = {}
+
+    class FakeClient:
+        def create_event(self, **kwargs):
+            created.update(kwargs)
+            return 'new.ics'
+
+    agent = calendar_agent_deepseek.CalendarAgentDeepSeek.__new__(calendar_agent_deepseek.CalendarAgentDeepSeek)
+    agent.calendar_client = FakeClient()
+    agent._handle_create_event({'title': '跨年', 'start_time': datetime(2025, 12, 31, 23, 30)})
+    assert created['end_time'] == datetime(2026, 1, 1, 0, 30)
+
+def test_parse_iso_fast_path_and_fallback():
+    """The prompted shape is built directly, other ISO forms fall back to fromisoformat"""
+    assert deepseek_parser._ISO_RE.match('2025-03-09T14:05:00')
+    assert deepseek_parser._parse_iso('2025-03-09T14:05:00') == datetime(2025, 3, 9, 14, 5)
+
+    for value in ('2025-03-09T14:05:00+08:00', '2025-03-09T14:05:00.250', '2025-03-09'):
+        assert not deepseek_parser._ISO_RE.match(value), value
+        assert deepseek_parser._parse_iso(value) == datetime.fromisoformat(value), value
+
+    try:
+        deepseek_parser._parse_iso('明天下午')
+        assert False, "a non-ISO string must raise"
+    except ValueError:
+        pass
+
+def test_parse_batch_keeps_results_aligned():
+    """Missing or malformed items become empty results in their own slot, the rest keep their position"""
+    import json
+
+    class FakeResponse:
+        def __init__(self, results):
+            content = json.dumps({"results": results}, ensure_ascii=False)
+            self.content = json.dumps({"choices": [{"message": {"content": content}}]}).encode()
+
+        def raise_for_status(self):
+            pass
+
+    replies = []
+
+    class FakeSession:
+        def post(self, url, json, timeout):
+            return FakeResponse(replies.pop(0))
+
+    parser = DeepSeekCalendarParser(api_key='test')
+    parser._session = FakeSession()
+    batch = ['查看今天的日程', '明天开会', '删除周会', '后天有空吗']
+    replies.append([
+        {'intent': 'read', 'start_time': '2025-03-09T00:00:00'},
+        'not an object',
+        {'intent': 'delete', 'start_time': '明天下午'},
+    ])
+
+    results = parser._parse_batch(batch)
+    assert len(results) == len(batch)
+    assert results[0]['intent'] == 'read' and results[0]['start_time'] == datetime(2025, 3, 9)
+    assert [result['intent'] for result in results[1:]] == [None, None, None]
+
+def main():
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    # Several checks exercise error paths on purpose; keep their log lines out of the report
+    logging.disable(logging.CRITICAL)
+
+    print("🧪 Running offline checks")
+    print("=" * 50)
+
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {type(e).__name__} {e}")
+
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()